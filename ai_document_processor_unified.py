@@ -7,23 +7,50 @@ AI文档处理器 - 统一版本
 """
 
 import argparse
+import collections
+import concurrent.futures
+import functools
+import hashlib
+import hmac
+import html
 import sys
 import os
+import json
+import logging
+import random
 import threading
-import webbrowser
+import types
 import time
 from pathlib import Path
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
 # 尝试导入Flask相关模块（用于图形界面）
 FLASK_AVAILABLE = False
 try:
-    from flask import Flask, request, jsonify, send_from_directory
+    from flask import Flask, Response, request, jsonify, send_from_directory
     from flask_cors import CORS
     FLASK_AVAILABLE = True
 except ImportError:
     pass
 
+# 尝试导入waitress（可选，生产级多线程WSGI服务器）
+WAITRESS_AVAILABLE = False
+try:
+    from waitress import serve as waitress_serve
+    WAITRESS_AVAILABLE = True
+except ImportError:
+    pass
+
+# 尝试导入orjson（可选，JSON序列化比标准库快数倍）
+ORJSON_AVAILABLE = False
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    pass
+
 # 尝试导入Ollama模块
 OLLAMA_AVAILABLE = False
 try:
@@ -32,71 +59,324 @@ try:
 except ImportError:
     pass
 
+# 按host缓存Ollama客户端，复用底层HTTP连接池（keep-alive），
+# 避免每个处理器实例重新建立TCP连接
+_OLLAMA_CLIENTS = {}
+
+# 格式化与文体分类是确定性任务：温度归零并固定seed，输出可复现，
+# 固定的提示词前缀也能命中服务端的前缀（KV）缓存
+_DETERMINISTIC_OPTIONS = {'temperature': 0, 'seed': 0}
+
+# 让Ollama在调用结束后保持模型常驻的时长，避免同一请求的
+# 多次生成调用之间模型被卸载再重新加载（8B模型重载需数秒）
+_MODEL_KEEP_ALIVE = "30m"
+
+# LLM调用的重试参数：对瞬时错误（连接中断、模型加载超时等）
+# 做指数退避重试，避免整个处理流程因一次抖动而失败
+_LLM_MAX_ATTEMPTS = 3
+_LLM_RETRY_BASE_SECONDS = 0.5
+
+def _call_with_retries(fn):
+    """执行LLM调用，失败时按指数退避（带随机抖动）重试"""
+    for attempt in range(_LLM_MAX_ATTEMPTS):
+        try:
+            return fn()
+        except Exception as e:
+            if attempt == _LLM_MAX_ATTEMPTS - 1:
+                raise
+            delay = _LLM_RETRY_BASE_SECONDS * (2 ** attempt) + random.uniform(0, 0.25)
+            logger.warning("LLM调用失败（第%d次）: %s，%.2f秒后重试", attempt + 1, e, delay)
+            time.sleep(delay)
+
+def _get_ollama_client(host):
+    """获取指定host的共享Ollama客户端"""
+    client = _OLLAMA_CLIENTS.get(host)
+    if client is None:
+        client = ollama.Client(host=host)
+        _OLLAMA_CLIENTS[host] = client
+    return client
+
+# 各文体的撰写提示词模板，模块加载时构建一次（只读），调用时只做format
+_STYLE_WRITE_PROMPTS = types.MappingProxyType({
+    "technical": "请撰写一篇关于'{topic}'的技术文档，要求包含：1)技术背景 2)核心原理 3)实现方法 4)应用示例 5)技术细节，使用专业术语并保持逻辑清晰。",
+    "academic": "请撰写一篇关于'{topic}'的学术论文，要求包含：1)摘要 2)引言 3)文献综述 4)研究方法 5)分析与讨论 6)结论 7)参考文献，遵循学术写作规范。",
+    "business": "请撰写一份关于'{topic}'的商务报告，要求包含：1)执行摘要 2)市场背景 3)分析与发现 4)战略建议 5)实施计划 6)风险评估 7)财务预测，语言专业且具有说服力。",
+    "creative": "请以'{topic}'为主题创作一篇引人入胜的文章，要求：1)吸引人的开头 2)生动的内容展开 3)情感共鸣 4)有力的结尾，语言富有表现力和感染力。"
+})
+
+# 未指定文体时的默认撰写提示词模板，同样只构建一次
+_DEFAULT_WRITE_TEMPLATE = """请根据以下主题撰写一篇结构完整、内容丰富的文档：
+
+主题：{topic}
+
+要求：
+1. 包含适当的标题和章节
+2. 内容详细且有条理
+3. 使用清晰的段落结构
+4. 如果适用，包含实例或数据支持
+"""
+
+# 各文体的排版提示词前缀，同样只构建一次
+_STYLE_FORMAT_PROMPTS = types.MappingProxyType({
+    "academic": "请将以下文档按照学术论文格式进行排版，包括标题、摘要、正文、参考文献等部分，要求格式规范、条理清晰：",
+    "business": "请将以下文档按照商务报告格式进行排版，包括执行摘要、主要章节、结论和建议等部分，要求专业、简洁：",
+    "technical": "请将以下文档按照技术文档格式进行排版，包括清晰的标题层级、代码块、图表说明等，要求准确、易读：",
+    "creative": "请将以下文档按照创意写作格式进行排版，包括引人入胜的开头、流畅的段落过渡和有力的结尾，要求富有表现力："
+})
+
+# 导出格式到文件扩展名的映射，模块加载时构建一次
+_EXPORT_EXTENSIONS = types.MappingProxyType({
+    "markdown": ".md",
+    "html": ".html",
+    "txt": ".txt"
+})
+
+# HTML导出的固定包装，预编码为UTF-8字节，导出时直接写出
+_HTML_PRE = """<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <title>AI生成文档</title>
+</head>
+<body>
+<pre>
+""".encode('utf-8')
+_HTML_POST = """
+</pre>
+</body>
+</html>""".encode('utf-8')
+
+# 超过该长度的文档在格式化时按段落边界分块处理，
+# 避免单条提示词超出模型上下文窗口导致截断
+_FORMAT_CHUNK_CHARS = 8000
+
+# 单次请求允许的最大内容长度（字符）。超出普通本地模型的上下文
+# 窗口的请求推理注定失败或被静默截断，提前拒绝以免白白占用模型
+_MAX_CONTENT_CHARS = 120_000
+
+# 合法的文体集合
+_STYLE_SET = frozenset({'technical', 'academic', 'business', 'creative'})
+
+def _parse_style(text, default='technical'):
+    """
+    从模型回答中提取文体词
+
+    先取首个词做O(1)集合查找（模型按要求只答一个词时的快路径），
+    模型附带了说明文字时再退回子串扫描
+
+    Args:
+        text: 模型的回答文本
+        default: 未识别出文体时的返回值
+
+    Returns:
+        文体类型或default
+    """
+    text = text.strip().lower()
+    words = text.split(maxsplit=1)
+    if words:
+        first = words[0].strip('.,:：。、')
+        if first in _STYLE_SET:
+            return first
+    for candidate in ('technical', 'academic', 'business', 'creative'):
+        if candidate in text:
+            return candidate
+    return default
+
+def _split_content(content, max_chars=_FORMAT_CHUNK_CHARS):
+    """
+    按段落边界把长文档切成不超过max_chars的块
+
+    Args:
+        content: 原始文档内容
+        max_chars: 单块的最大字符数
+
+    Returns:
+        文档块列表（按原文顺序）
+    """
+    paragraphs = content.split('\n\n')
+    chunks = []
+    current = []
+    current_len = 0
+    for para in paragraphs:
+        para_len = len(para) + 2
+        if current and current_len + para_len > max_chars:
+            chunks.append('\n\n'.join(current))
+            current = []
+            current_len = 0
+        current.append(para)
+        current_len += para_len
+    if current:
+        chunks.append('\n\n'.join(current))
+    return chunks
+
+def _ensure_parent_dir(path):
+    """确保输出文件所在目录存在（单次系统调用，目录已存在时不报错）"""
+    parent = Path(path).parent
+    if parent != Path('.'):
+        parent.mkdir(parents=True, exist_ok=True)
+
+def _write_bytes(path, *chunks):
+    """
+    直接用文件描述符依次写出字节块，省去TextIOWrapper和额外编码缓冲
+
+    先写同目录下的临时文件再os.replace原子替换，写入中途失败或
+    进程被杀时不会留下半截的目标文件
+    """
+    path = os.fspath(path)
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        try:
+            for chunk in chunks:
+                os.write(fd, chunk)
+        finally:
+            os.close(fd)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+# 格式化结果缓存：按(模型, 文体, 内容哈希)复用近期结果，
+# 重复提交相同内容时省去一次完整的LLM推理
+_FORMAT_CACHE = collections.OrderedDict()
+_FORMAT_CACHE_MAX = 128
+_FORMAT_CACHE_LOCK = threading.Lock()
+
+def _format_cache_key(model, style, content):
+    """计算格式化缓存键（内容取哈希，避免把整篇文档当字典键）"""
+    digest = hashlib.blake2b(content.encode('utf-8'), digest_size=16)
+    digest.update(style.encode('utf-8'))
+    digest.update(model.encode('utf-8'))
+    return digest.hexdigest()
+
+def _format_cache_get(key):
+    """查询格式化缓存，命中时刷新其LRU位置"""
+    with _FORMAT_CACHE_LOCK:
+        result = _FORMAT_CACHE.get(key)
+        if result is not None:
+            _FORMAT_CACHE.move_to_end(key)
+        return result
+
+def _format_cache_put(key, value):
+    """写入格式化缓存，超出容量时淘汰最久未用的条目"""
+    with _FORMAT_CACHE_LOCK:
+        _FORMAT_CACHE[key] = value
+        _FORMAT_CACHE.move_to_end(key)
+        while len(_FORMAT_CACHE) > _FORMAT_CACHE_MAX:
+            _FORMAT_CACHE.popitem(last=False)
+
+@functools.lru_cache(maxsize=512)
+def _classify_style_cached(host, model, prompt):
+    """调用Ollama对主题进行文体分类，结果按(host, model, prompt)缓存"""
+    analysis_prompt = f"""根据以下主题或内容，分析并推荐最适合的文档文体和排版风格：
+
+主题或内容：{prompt}
+
+请从以下选项中选择最合适的文体：
+1. technical - 技术文档：适合技术说明、开发文档、API文档等
+2. academic - 学术论文：适合学术研究、论文、研究报告等
+3. business - 商务报告：适合商业计划、市场分析、企业报告等
+4. creative - 创意写作：适合博客文章、故事、宣传文案等
+
+请只回答一个词：technical、academic、business或creative，并简要说明理由（不超过20字）。
+"""
+
+    def attempt():
+        response = _get_ollama_client(host).generate(
+            model=model,
+            prompt=analysis_prompt,
+            options=_DETERMINISTIC_OPTIONS,
+            keep_alive=_MODEL_KEEP_ALIVE
+        )
+
+        # 解析响应，提取文体类型（未识别时默认返回技术文档）
+        return _parse_style(response['response'])
+
+    try:
+        return _call_with_retries(attempt)
+    except Exception as e:
+        logger.error("文体分析失败: %s", e)
+        return 'technical'  # 出错时默认返回技术文档
+
 class AIDocumentProcessor:
     def __init__(self, model="qwen3:8b", host="http://127.0.0.1:11434"):
         """
         初始化AI文档处理器
-        
+
         Args:
             model: 使用的模型名称
             host: Ollama服务地址
         """
         self.model = model
+        self.host = host
         if OLLAMA_AVAILABLE:
-            self.client = ollama.Client(host=host)
+            self.client = _get_ollama_client(host)
         self.default_options = {
             'temperature': 0.7,
             'top_p': 0.9
         }
     
-    def analyze_content_for_style(self, prompt):
+    def analyze_content_for_style(self, prompt, model=None):
         """
         让AI分析内容并推荐合适的文体
-        
+
         Args:
             prompt: 文档主题或内容
-            
+            model: 使用的模型，默认为实例模型
+
         Returns:
             推荐的文体类型
         """
         if not OLLAMA_AVAILABLE:
             return "technical"
-            
-        analysis_prompt = f"""根据以下主题或内容，分析并推荐最适合的文档文体和排版风格：
 
-主题或内容：{prompt}
+        # 相同提示词的分类结果可复用，缓存后重复请求无需再次推理
+        return _classify_style_cached(self.host, model or self.model, prompt)
 
-请从以下选项中选择最合适的文体：
-1. technical - 技术文档：适合技术说明、开发文档、API文档等
-2. academic - 学术论文：适合学术研究、论文、研究报告等
-3. business - 商务报告：适合商业计划、市场分析、企业报告等
-4. creative - 创意写作：适合博客文章、故事、宣传文案等
+    def _generate_streamed(self, prompt, options, output_file=None, model=None):
+        """
+        流式调用Ollama生成接口
 
-请只回答一个词：technical、academic、business或creative，并简要说明理由（不超过20字）。
-"""
-        
-        try:
-            response = self.client.generate(
-                model=self.model,
-                prompt=analysis_prompt,
-                options={'temperature': 0.3}
+        边接收边拼接（必要时边写文件），峰值内存只占一个响应块，
+        而不是整段生成结果的两份拷贝
+
+        Args:
+            prompt: 完整提示词
+            options: 生成参数
+            output_file: 可选，边生成边写入的文件路径
+
+        Returns:
+            完整的生成内容
+        """
+        def attempt():
+            stream = self.client.generate(
+                model=model or self.model,
+                prompt=prompt,
+                options=options,
+                stream=True,
+                keep_alive=_MODEL_KEEP_ALIVE
             )
-            
-            # 解析响应，提取文体类型
-            content = response['response'].strip().lower()
-            if 'technical' in content:
-                return 'technical'
-            elif 'academic' in content:
-                return 'academic'
-            elif 'business' in content:
-                return 'business'
-            elif 'creative' in content:
-                return 'creative'
+
+            parts = []
+            if output_file:
+                _ensure_parent_dir(output_file)
+                # 'w'模式每次重试都会截断重写，不会残留上次的半截输出
+                with open(output_file, 'w', encoding='utf-8') as f:
+                    for chunk in stream:
+                        piece = chunk['response']
+                        f.write(piece)
+                        parts.append(piece)
             else:
-                return 'technical'  # 默认返回技术文档
-        except Exception:
-            return 'technical'  # 出错时默认返回技术文档
-    
+                for chunk in stream:
+                    parts.append(chunk['response'])
+
+            return ''.join(parts)
+
+        return _call_with_retries(attempt)
+
     def generate_prompt_by_style(self, topic, style):
         """
         根据推荐的文体生成更合适的提示词
@@ -108,58 +388,77 @@ class AIDocumentProcessor:
         Returns:
             优化后的提示词
         """
-        style_prompts = {
-            "technical": f"请撰写一篇关于'{topic}'的技术文档，要求包含：1)技术背景 2)核心原理 3)实现方法 4)应用示例 5)技术细节，使用专业术语并保持逻辑清晰。",
-            "academic": f"请撰写一篇关于'{topic}'的学术论文，要求包含：1)摘要 2)引言 3)文献综述 4)研究方法 5)分析与讨论 6)结论 7)参考文献，遵循学术写作规范。",
-            "business": f"请撰写一份关于'{topic}'的商务报告，要求包含：1)执行摘要 2)市场背景 3)分析与发现 4)战略建议 5)实施计划 6)风险评估 7)财务预测，语言专业且具有说服力。",
-            "creative": f"请以'{topic}'为主题创作一篇引人入胜的文章，要求：1)吸引人的开头 2)生动的内容展开 3)情感共鸣 4)有力的结尾，语言富有表现力和感染力。"
-        }
-        
-        return style_prompts.get(style, style_prompts["technical"])
+        template = _STYLE_WRITE_PROMPTS.get(style, _STYLE_WRITE_PROMPTS["technical"])
+        return template.format(topic=topic)
     
-    def write_document(self, prompt, auto_style=False):
+    def write_with_auto_style(self, prompt, model=None):
+        """
+        单次调用完成文体分析和文档撰写
+
+        让模型在第一行输出文体，空行后输出正文，一次推理同时
+        得到两项结果，省去单独的文体分析调用
+
+        Args:
+            prompt: 文档主题或内容
+
+        Returns:
+            (文体类型, 生成的文档内容)
+        """
+        if not OLLAMA_AVAILABLE:
+            return "technical", "错误：未安装Ollama客户端，请先安装Ollama。"
+
+        fused_prompt = f"""请根据以下主题撰写一篇结构完整、内容丰富的文档：
+
+主题：{prompt}
+
+输出要求：
+1. 第一行只输出一个最适合该主题的文体词：technical（技术文档）、academic（学术论文）、business（商务报告）或creative（创意写作）
+2. 第二行留空
+3. 从第三行开始，按所选文体的规范撰写完整正文，包含适当的标题和章节，内容详细且有条理
+"""
+
+        try:
+            raw = self._generate_streamed(fused_prompt, self.default_options, model=model)
+        except Exception as e:
+            logger.error("文档撰写失败: %s", e)
+            return "technical", f"文档撰写失败: {str(e)}"
+
+        # 解析首行的文体标记，其余部分作为正文
+        head, _, body = raw.partition('\n\n')
+        style = _parse_style(head, default=None)
+        if style and body.strip():
+            return style, body.lstrip('\n')
+
+        # 模型未按约定输出时，退回整段内容和默认文体
+        return 'technical', raw
+
+    def write_document(self, prompt, auto_style=False, model=None):
         """
         使用AI撰写文档
-        
+
         Args:
             prompt: 写作提示
             auto_style: 是否自动分析文体
-            
+
         Returns:
             生成的文档内容
         """
         if not OLLAMA_AVAILABLE:
             return "错误：未安装Ollama客户端，请先安装Ollama。"
-            
-        # 如果启用自动风格分析
-        if auto_style:
-            recommended_style = self.analyze_content_for_style(prompt)
-            optimized_prompt = self.generate_prompt_by_style(prompt, recommended_style)
-        else:
-            # 使用用户提供的主题直接生成提示词
-            optimized_prompt = f"""请根据以下主题撰写一篇结构完整、内容丰富的文档：
 
-主题：{prompt}
+        # 如果启用自动风格分析（文体判断与撰写合并为一次调用）
+        if auto_style:
+            return self.write_with_auto_style(prompt, model=model)[1]
+        # 使用用户提供的主题直接生成提示词
+        optimized_prompt = _DEFAULT_WRITE_TEMPLATE.format(topic=prompt)
 
-要求：
-1. 包含适当的标题和章节
-2. 内容详细且有条理
-3. 使用清晰的段落结构
-4. 如果适用，包含实例或数据支持
-"""
-        
         try:
-            response = self.client.generate(
-                model=self.model,
-                prompt=optimized_prompt if auto_style else optimized_prompt,
-                options=self.default_options
-            )
-            
-            return response['response']
+            return self._generate_streamed(optimized_prompt, self.default_options, model=model)
         except Exception as e:
+            logger.error("文档撰写失败: %s", e)
             return f"文档撰写失败: {str(e)}"
     
-    def format_document(self, content, style="technical", output_file=None):
+    def format_document(self, content, style="technical", output_file=None, model=None):
         """
         使用AI格式化文档
         
@@ -174,33 +473,60 @@ class AIDocumentProcessor:
         if not OLLAMA_AVAILABLE:
             return "错误：未安装Ollama客户端，请先安装Ollama。"
             
-        # 根据风格定义提示词
-        style_prompts = {
-            "academic": "请将以下文档按照学术论文格式进行排版，包括标题、摘要、正文、参考文献等部分，要求格式规范、条理清晰：",
-            "business": "请将以下文档按照商务报告格式进行排版，包括执行摘要、主要章节、结论和建议等部分，要求专业、简洁：",
-            "technical": "请将以下文档按照技术文档格式进行排版，包括清晰的标题层级、代码块、图表说明等，要求准确、易读：",
-            "creative": "请将以下文档按照创意写作格式进行排版，包括引人入胜的开头、流畅的段落过渡和有力的结尾，要求富有表现力："
-        }
-        
-        prompt_prefix = style_prompts.get(style, style_prompts["technical"])
+        # 相同内容+文体+模型的重复请求直接复用缓存结果
+        cache_key = _format_cache_key(model or self.model, style, content)
+        cached = _format_cache_get(cache_key)
+        if cached is not None:
+            if output_file:
+                _ensure_parent_dir(output_file)
+                _write_bytes(output_file, cached.encode('utf-8'))
+            return cached
+
+        # 根据风格选择提示词前缀
+        prompt_prefix = _STYLE_FORMAT_PROMPTS.get(style, _STYLE_FORMAT_PROMPTS["technical"])
+
+        # 长文档按段落分块并行格式化，再按原文顺序拼接，
+        # 避免单条提示词超出模型上下文窗口
+        if len(content) > _FORMAT_CHUNK_CHARS:
+            chunks = _split_content(content)
+            if len(chunks) > 1:
+                try:
+                    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+                        results = list(executor.map(
+                            lambda chunk: self._generate_streamed(
+                                f"{prompt_prefix}\n\n{chunk}",
+                                _DETERMINISTIC_OPTIONS,
+                                model=model
+                            ),
+                            chunks
+                        ))
+                except Exception as e:
+                    logger.error("文档格式化失败: %s", e)
+                    return f"文档格式化失败: {str(e)}"
+
+                formatted_content = '\n\n'.join(results)
+                if output_file:
+                    _ensure_parent_dir(output_file)
+                    _write_bytes(output_file, formatted_content.encode('utf-8'))
+                _format_cache_put(cache_key, formatted_content)
+                return formatted_content
+
         prompt = f"{prompt_prefix}\n\n{content}"
-        
+
         try:
-            response = self.client.generate(
-                model=self.model,
-                prompt=prompt,
-                options={'temperature': 0.5}  # 降低创造性以保持准确性
+            # 确定性选项保证排版结果可复现；流式输出可边生成边写入文件
+            formatted_content = self._generate_streamed(
+                prompt,
+                _DETERMINISTIC_OPTIONS,
+                output_file=output_file,
+                model=model
             )
-            
-            formatted_content = response['response']
-            
-            if output_file:
-                with open(output_file, 'w', encoding='utf-8') as f:
-                    f.write(formatted_content)
-            
-            return formatted_content
         except Exception as e:
+            logger.error("文档格式化失败: %s", e)
             return f"文档格式化失败: {str(e)}"
+
+        _format_cache_put(cache_key, formatted_content)
+        return formatted_content
     
     def export_document(self, content, format_type="markdown", output_file=None):
         """
@@ -214,36 +540,18 @@ class AIDocumentProcessor:
         # 如果没有指定输出文件，生成默认文件名
         if not output_file:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            extensions = {
-                "markdown": ".md",
-                "html": ".html",
-                "txt": ".txt"
-            }
-            ext = extensions.get(format_type, f".{format_type}")
+            ext = _EXPORT_EXTENSIONS.get(format_type, f".{format_type}")
             output_file = f"document_{timestamp}{ext}"
         
-        # 根据格式类型处理内容
+        # 保存文件（HTML包装分段写出，不在内存中再拼一份完整文档）
+        _ensure_parent_dir(output_file)
         if format_type == "html":
-            html_content = f"""<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="utf-8">
-    <title>AI生成文档</title>
-</head>
-<body>
-<pre>
-{content}
-</pre>
-</body>
-</html>"""
-            final_content = html_content
+            # 转义内容，避免文档中的<script>或</pre>破坏页面结构
+            _write_bytes(output_file, _HTML_PRE,
+                         html.escape(content).encode('utf-8'), _HTML_POST)
         else:
-            final_content = content
-        
-        # 保存文件
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(final_content)
-        
+            _write_bytes(output_file, content.encode('utf-8'))
+
         return output_file
     
     def process_document(self, prompt, style="auto", format_type="markdown", output_file=None):
@@ -259,24 +567,56 @@ class AIDocumentProcessor:
         if not OLLAMA_AVAILABLE:
             return "错误：未安装Ollama客户端，请先安装Ollama。"
             
-        # 如果style为'auto'，则使用自动分析
+        # 步骤1: 撰写文档（style为'auto'时文体分析与撰写合并为一次调用）
         if style == "auto":
-            style = self.analyze_content_for_style(prompt)
-            auto_style = True
+            style, content = self.write_with_auto_style(prompt)
+            # 合并调用已按所选文体生成正文，无需再做一次格式化推理
+            formatted_content = content
         else:
-            auto_style = False
-        
-        # 步骤1: 撰写文档
-        content = self.write_document(prompt, auto_style)
-        
-        # 步骤2: 格式化文档
-        formatted_content = self.format_document(content, style)
+            content = self.write_document(prompt, False)
+            # 步骤2: 格式化文档
+            formatted_content = self.format_document(content, style)
         
         # 步骤3: 导出文档
         export_file = self.export_document(formatted_content, format_type, output_file)
-        
+
         return export_file, style
 
+    def process_documents(self, jobs, max_workers=4):
+        """
+        批量处理多个文档，网络等待相互重叠
+
+        Args:
+            jobs: 任务列表，每项为传给process_document的参数字典
+            max_workers: 最大并发数（受限，避免压垮Ollama服务）
+
+        Returns:
+            处理结果列表（与jobs顺序一致），每项为process_document的返回值
+        """
+        if not OLLAMA_AVAILABLE:
+            return ["错误：未安装Ollama客户端，请先安装Ollama。"] * len(jobs)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(lambda job: self.process_document(**job), jobs))
+
+
+def _json_response(payload, status=200):
+    """构造JSON响应，可用时使用orjson序列化以减少CPU开销"""
+    if ORJSON_AVAILABLE:
+        return Response(orjson.dumps(payload), status=status,
+                        mimetype='application/json')
+    return jsonify(payload), status
+
+
+def _json_body():
+    """解析请求体JSON，可用时使用orjson；解析失败返回None"""
+    if ORJSON_AVAILABLE:
+        try:
+            return orjson.loads(request.get_data())
+        except Exception:
+            return None
+    return request.get_json(silent=True)
+
 
 def create_flask_app():
     """创建Flask应用"""
@@ -285,7 +625,26 @@ def create_flask_app():
         
     app = Flask(__name__)
     CORS(app)
-    
+
+    # 可选的API密钥保护：设置AIWRITE_API_KEY环境变量后，
+    # 所有/api/请求必须携带匹配的X-API-Key请求头
+    api_key = os.environ.get('AIWRITE_API_KEY')
+    if api_key:
+        api_key_bytes = api_key.encode('utf-8')
+
+        @app.before_request
+        def check_api_key():
+            if not request.path.startswith('/api/'):
+                return None
+            provided = request.headers.get('X-API-Key', '')
+            # 常数时间比较，避免逐字节早退泄露时序信息
+            if not hmac.compare_digest(provided.encode('utf-8'), api_key_bytes):
+                return _json_response({
+                    'success': False,
+                    'message': '无效的API密钥'
+                }, 403)
+            return None
+
     # 初始化文档处理器
     processor = AIDocumentProcessor()
     
@@ -308,34 +667,33 @@ def create_flask_app():
     def process_document():
         """处理完整文档流程：撰写 -> 格式化"""
         try:
-            data = request.get_json()
+            data = _json_body() or {}
             prompt = data.get('prompt', '')
             model = data.get('model', 'qwen3:8b')
             style = data.get('style', 'auto')
             
             if not prompt:
-                return jsonify({
+                return _json_response({
                     'success': False,
                     'message': '提示词不能为空'
-                }), 400
-            
-            # 设置模型
-            processor.model = model
+                }, 400)
+
+            if len(prompt) > _MAX_CONTENT_CHARS:
+                return _json_response({
+                    'success': False,
+                    'message': f'提示词过长（超过{_MAX_CONTENT_CHARS}字符）'
+                }, 413)
             
-            # 如果style为'auto'，则使用自动分析
+            # 步骤1: 撰写文档（style为'auto'时文体分析与撰写合并为一次调用）
             if style == 'auto':
-                style = processor.analyze_content_for_style(prompt)
-                auto_style = True
+                style, formatted_content = processor.write_with_auto_style(prompt, model=model)
+                # 合并调用已按所选文体生成正文，无需再做一次格式化推理
             else:
-                auto_style = False
+                content = processor.write_document(prompt, False, model=model)
+                # 步骤2: 格式化文档
+                formatted_content = processor.format_document(content, style, model=model)
             
-            # 步骤1: 撰写文档
-            content = processor.write_document(prompt, auto_style)
-            
-            # 步骤2: 格式化文档
-            formatted_content = processor.format_document(content, style)
-            
-            return jsonify({
+            return _json_response({
                 'success': True,
                 'message': '文档处理完成',
                 'content': formatted_content,
@@ -343,115 +701,130 @@ def create_flask_app():
             })
             
         except Exception as e:
-            return jsonify({
+            logger.exception("文档处理接口出错")
+            return _json_response({
                 'success': False,
                 'message': f'处理失败: {str(e)}'
-            }), 500
+            }, 500)
     
     @app.route('/api/document/write', methods=['POST'])
     def write_document():
         """仅撰写文档"""
         try:
-            data = request.get_json()
+            data = _json_body() or {}
             prompt = data.get('prompt', '')
             model = data.get('model', 'qwen3:8b')
             
             if not prompt:
-                return jsonify({
+                return _json_response({
                     'success': False,
                     'message': '提示词不能为空'
-                }), 400
-            
-            # 设置模型
-            processor.model = model
+                }, 400)
+
+            if len(prompt) > _MAX_CONTENT_CHARS:
+                return _json_response({
+                    'success': False,
+                    'message': f'提示词过长（超过{_MAX_CONTENT_CHARS}字符）'
+                }, 413)
             
             # 撰写文档
-            content = processor.write_document(prompt, False)
+            content = processor.write_document(prompt, False, model=model)
             
-            return jsonify({
+            return _json_response({
                 'success': True,
                 'message': '文档撰写完成',
                 'content': content
             })
             
         except Exception as e:
-            return jsonify({
+            logger.exception("文档撰写接口出错")
+            return _json_response({
                 'success': False,
                 'message': f'撰写失败: {str(e)}'
-            }), 500
+            }, 500)
     
     @app.route('/api/document/format', methods=['POST'])
     def format_document():
         """仅格式化文档"""
         try:
-            data = request.get_json()
+            data = _json_body() or {}
             content = data.get('content', '')
             style = data.get('style', 'technical')
             model = data.get('model', 'qwen3:8b')
             
             if not content:
-                return jsonify({
+                return _json_response({
                     'success': False,
                     'message': '内容不能为空'
-                }), 400
-            
-            # 设置模型
-            processor.model = model
+                }, 400)
+
+            if len(content) > _MAX_CONTENT_CHARS:
+                return _json_response({
+                    'success': False,
+                    'message': f'内容过长（超过{_MAX_CONTENT_CHARS}字符），请分段处理'
+                }, 413)
             
             # 格式化文档
-            formatted_content = processor.format_document(content, style)
+            formatted_content = processor.format_document(content, style, model=model)
             
-            return jsonify({
+            return _json_response({
                 'success': True,
                 'message': '文档格式化完成',
                 'content': formatted_content
             })
             
         except Exception as e:
-            return jsonify({
+            logger.exception("文档格式化接口出错")
+            return _json_response({
                 'success': False,
                 'message': f'格式化失败: {str(e)}'
-            }), 500
+            }, 500)
     
     @app.route('/api/document/export', methods=['POST'])
     def export_document():
         """导出文档"""
         try:
-            data = request.get_json()
+            data = _json_body() or {}
             content = data.get('content', '')
             format_type = data.get('format', 'markdown')
             
             if not content:
-                return jsonify({
+                return _json_response({
                     'success': False,
                     'message': '内容不能为空'
-                }), 400
+                }, 400)
             
             # 导出文档
             output_file = processor.export_document(content, format_type)
             
-            return jsonify({
+            return _json_response({
                 'success': True,
                 'message': '文档导出完成',
                 'file': output_file
             })
             
         except Exception as e:
-            return jsonify({
+            logger.exception("文档导出接口出错")
+            return _json_response({
                 'success': False,
                 'message': f'导出失败: {str(e)}'
-            }), 500
+            }, 500)
     
+    # 模型列表暂为预定义的常量（将来应调用Ollama API获取实际列表），
+    # 响应体在应用创建时序列化一次，每次请求直接写出字节
+    models_payload = {
+        'success': True,
+        'models': ["qwen3:8b", "llama3:8b", "mistral:7b", "gemma:7b"]
+    }
+    if ORJSON_AVAILABLE:
+        models_body = orjson.dumps(models_payload)
+    else:
+        models_body = json.dumps(models_payload, separators=(',', ':')).encode('utf-8')
+
     @app.route('/api/document/models', methods=['GET'])
     def get_models():
         """获取可用模型列表"""
-        # 这里应该调用Ollama API获取实际模型列表
-        # 暂时返回预定义的模型列表
-        models = ["qwen3:8b", "llama3:8b", "mistral:7b", "gemma:7b"]
-        return jsonify({
-            'success': True,
-            'models': models
-        })
+        return Response(models_body, mimetype='application/json')
     
     return app
 
@@ -467,7 +840,12 @@ def run_web_interface(port=8080):
     print(f"AI文档处理器Web服务启动中...")
     print(f"访问地址: http://localhost:{port}")
     print("确保Ollama服务正在运行在 http://localhost:11434")
-    app.run(host='0.0.0.0', port=port, debug=False)
+    if WAITRESS_AVAILABLE:
+        # 多线程WSGI服务器，长时间的生成请求可以并发处理
+        waitress_serve(app, host='0.0.0.0', port=port, threads=8)
+    else:
+        print("提示：未安装waitress，使用Flask内置服务器（建议 pip install waitress）")
+        app.run(host='0.0.0.0', port=port, debug=False)
 
 
 def main():
@@ -498,10 +876,22 @@ def main():
         if args.action == "gui":
             # 尝试自动打开浏览器
             def open_browser():
-                time.sleep(2)
-                webbrowser.open(f"http://localhost:{args.port}")
-            
-            threading.Thread(target=open_browser).start()
+                # 轮询探测服务是否就绪，就绪后立即打开浏览器，
+                # 避免固定等待2秒（服务更快时浪费时间，更慢时打开空页面）。
+                # 仅gui模式用得到这两个模块，延迟到此处导入
+                import urllib.request
+                import webbrowser
+
+                url = f"http://localhost:{args.port}"
+                for _ in range(100):
+                    try:
+                        urllib.request.urlopen(url, timeout=0.2).close()
+                        break
+                    except Exception:
+                        time.sleep(0.05)
+                webbrowser.open(url)
+
+            threading.Thread(target=open_browser, daemon=True).start()
         
         run_web_interface(args.port)
         
@@ -512,8 +902,8 @@ def main():
         
         content = processor.write_document(args.input, args.style == "auto")
         if args.output:
-            with open(args.output, 'w', encoding='utf-8') as f:
-                f.write(content)
+            _ensure_parent_dir(args.output)
+            _write_bytes(args.output, content.encode('utf-8'))
             print(f"文档已保存到: {args.output}")
         else:
             print(content)